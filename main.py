@@ -16,50 +16,423 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import atexit
-import base64
-import glob
+import binascii
+import contextlib
+import functools
 import io
+import multiprocessing
 import os
+import queue
 import re
 import signal
 import subprocess
 import sys
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
 
 import click
-import img2pdf
-from PIL import Image
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.action_chains import ActionChains
-from tqdm import tqdm
-from webdriver_manager.chrome import ChromeDriverManager
+
+
+_DEFAULT_OUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dl_files")
 
 
 def url_checker(url):
     """Check if URL is a valid box.com URL."""
-    url_check_regex = re.compile(
-        r'^(?:http|ftp)s?://'
-        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|[A-Z0-9-]{2,}\.?)|'
-        r'localhost|'
-        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'
-        r'(?::\d+)?'
-        r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-    if re.match(url_check_regex, url) is not None:
-        return "box.com" in url
-    return False
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return False
+    host = parts.hostname or ""
+    return parts.scheme in ("http", "https") and (host == "box.com" or host.endswith(".box.com"))
+
+
+# The file name from a "<name>.<ext> | Powered by Box" page title, without its extension
+_TITLE_RE = re.compile(r'\s*(.*?)\s*(?:\.[^.\s|]+)?\s*(?:\||$)')
+
+_DIGITS_RE = re.compile(r'(\d+)')
+
+
+def _natural_key(path):
+    """Sort key that orders embedded numbers numerically (page_2 before page_10)."""
+    return [int(part) if part.isdigit() else part for part in _DIGITS_RE.split(path)]
+
+
+def _list_pages(directory):
+    """Return the sorted paths of captured page_*.png / page_*.jpg images in directory."""
+    with os.scandir(directory) as entries:
+        pages = [entry.path for entry in entries
+                 if entry.name.startswith('page_') and entry.name.endswith(('.png', '.jpg'))
+                 and entry.is_file()]
+    pages.sort(key=_natural_key)
+    return pages
+
+
+def _write_file(path, data):
+    # One unbuffered write: a file object would only copy data into its buffer first
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def _decode_data_url(data_url):
+    """Return the bytes of a base64 data: URL."""
+    # Encode once and decode from a view past the comma; splitting the str would
+    # copy the multi-MB payload, and base64.b64decode copies any memoryview it is
+    # given, whereas binascii decodes straight from the buffer.
+    data_url = data_url.encode('ascii')
+    comma = data_url.index(b',')
+    return binascii.a2b_base64(memoryview(data_url)[comma + 1:])
+
+
+def _drain_writes(writes, results):
+    """Decode and write queued (page_num, path, data_url) items until a None sentinel arrives.
+
+    Appends (page_num, path, error) to results, with error None on success.
+    """
+    while True:
+        item = writes.get()
+        if item is None:
+            return
+        page_num, path, data_url = item
+        try:
+            _write_file(path, _decode_data_url(data_url))
+            results.append((page_num, path, None))
+        except (OSError, ValueError) as e:
+            results.append((page_num, path, e))
+
+
+def _to_grayscale_png(path):
+    """Return the image at path converted to 8-bit grayscale, PNG-encoded."""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        if img.mode == 'L':
+            if img.format == 'PNG':
+                with open(path, 'rb') as f:
+                    return f.read()
+            gray = img
+            gray.load()
+        else:
+            gray = img.convert('L')
+    buf = io.BytesIO()
+    gray.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+# Async script: calls back true once the preview shows a rendered page (a large
+# data: image, a sizeable canvas, or a document container taller than one screen),
+# or false after arguments[0] milliseconds. Checks run as the DOM changes rather
+# than on a fixed poll from Python.
+_PREVIEW_READY_JS = """
+    var timeoutMs = arguments[0], callback = arguments[arguments.length - 1];
+    function ready() {
+        return Array.prototype.some.call(document.querySelectorAll('img[src^="data:"]'),
+                   function(img) { return img.src.length > 1000; }) ||
+               Array.prototype.some.call(document.querySelectorAll('canvas'), function(c) {
+                   var rect = c.getBoundingClientRect();
+                   return rect.width > 100 && rect.height > 100;
+               }) ||
+               Array.prototype.some.call(document.querySelectorAll('[class*="bp-doc"], [class*="PreviewContent"]'),
+                   function(el) { return el.scrollHeight > 1000; });
+    }
+    if (ready()) return callback(true);
+    var done = false;
+    var observer = new MutationObserver(check);
+    // Backstop for changes that aren't mutations, such as layout settling
+    var interval = setInterval(check, 250);
+    var timer = setTimeout(function() { finish(false); }, timeoutMs);
+    function finish(result) {
+        if (done) return;
+        done = true;
+        observer.disconnect();
+        clearInterval(interval);
+        clearTimeout(timer);
+        callback(result);
+    }
+    function check() {
+        if (ready()) finish(true);
+    }
+    observer.observe(document.documentElement, {
+        childList: true, subtree: true, attributes: true, attributeFilter: ['src', 'width', 'height', 'class']
+    });
+"""
+
+
+# Page capture helpers, registered with the browser once so they are in place
+# before the viewer loads, and each page only costs a one-line call instead of
+# re-sending the whole script.
+# capturePage(format, callback) returns the rendered page nearest the viewport
+# centre as {dataUrl, width, height}, or null; nextPage() clicks "next" and
+# reports whether there was a next page; pageReady(n) reports whether page n
+# has finished rendering (null if the viewer layout is not recognised).
+_CAPTURE_HELPERS_JS = """
+    window.__boxCapture = {
+        _root: null,
+        _nextBtn: null,
+        previewRoot: function() {
+            // Search only the preview, not the whole app shell; re-resolved if
+            // the viewer replaces its container.
+            if (!this._root || !document.contains(this._root)) {
+                this._root = document.querySelector('.bp-doc, .bp-content');
+            }
+            return this._root || document;
+        },
+        capturePage: function(format, callback, onSnapshot) {
+            // onSnapshot, if given, runs as soon as the page's pixels have been
+            // taken, before they are encoded.
+            var self = this;
+            var mime = 'image/' + format;
+            var startTime = Date.now();
+            var maxWait = 2000;
+            var minWidth = 800;
+
+            function tryCapture() {
+                var viewportCenter = window.innerHeight / 2;
+                var bestElement = null;
+                var bestDistance = Infinity;
+                var bestType = null;
+
+                var root = self.previewRoot();
+                var canvases = root.querySelectorAll('canvas');
+                for (var i = 0; i < canvases.length; i++) {
+                    var c = canvases[i];
+                    // Bitmap size needs no layout; only measure real candidates
+                    if (c.width < minWidth) continue;
+                    var rect = c.getBoundingClientRect();
+                    if (rect.height > 100) {
+                        var center = rect.top + rect.height / 2;
+                        var distance = Math.abs(center - viewportCenter);
+                        if (distance < bestDistance) {
+                            bestDistance = distance;
+                            bestElement = c;
+                            bestType = 'canvas';
+                        }
+                    }
+                }
+
+                var imgs = root.querySelectorAll('img');
+                for (var i = 0; i < imgs.length; i++) {
+                    var img = imgs[i];
+                    if (img.naturalWidth < minWidth ||
+                        !(img.src.startsWith('blob:') || img.src.startsWith('data:'))) continue;
+                    var rect = img.getBoundingClientRect();
+                    if (rect.height > 100) {
+                        var center = rect.top + rect.height / 2;
+                        var distance = Math.abs(center - viewportCenter);
+                        if (distance < bestDistance) {
+                            bestDistance = distance;
+                            bestElement = img;
+                            bestType = 'img';
+                        }
+                    }
+                }
+
+                if (!bestElement) {
+                    if (Date.now() - startTime < maxWait) {
+                        setTimeout(tryCapture, 100);
+                    } else {
+                        callback(null);
+                    }
+                    return;
+                }
+
+                var width, height;
+                function finish(dataUrl) {
+                    if (dataUrl && dataUrl.length > 1000) {
+                        callback({ dataUrl: dataUrl, width: width, height: height });
+                    } else {
+                        callback(null);
+                    }
+                }
+
+                try {
+                    var source = bestElement;
+                    if (bestType === 'canvas') {
+                        width = bestElement.width;
+                        height = bestElement.height;
+                    } else {
+                        width = bestElement.naturalWidth;
+                        height = bestElement.naturalHeight;
+                        if (bestElement.src.startsWith('data:image/jpeg;') ||
+                            bestElement.src.startsWith('data:' + mime + ';')) {
+                            // Already encoded: hand back the original bytes instead
+                            // of redrawing and re-encoding them.
+                            if (onSnapshot) onSnapshot();
+                            finish(bestElement.src);
+                            return;
+                        }
+                        source = document.createElement('canvas');
+                        source.width = width;
+                        source.height = height;
+                        var ctx = source.getContext('2d');
+                        if (mime === 'image/jpeg') {
+                            // JPEG has no alpha; flatten onto white rather than black
+                            ctx.fillStyle = '#fff';
+                            ctx.fillRect(0, 0, width, height);
+                        }
+                        ctx.drawImage(bestElement, 0, 0);
+                    }
+                    // toBlob copies the pixels immediately and encodes off the main
+                    // thread, so the viewer can move on while this page is encoded.
+                    source.toBlob(function(blob) {
+                        if (!blob) return callback(null);
+                        var reader = new FileReader();
+                        reader.onload = function() { finish(reader.result); };
+                        reader.onerror = function() { callback(null); };
+                        reader.readAsDataURL(blob);
+                    }, mime, 0.9);
+                } catch(e) {
+                    callback(null);
+                    return;
+                }
+                if (onSnapshot) onSnapshot();
+            }
+            tryCapture();
+        },
+        captureAndAdvance: function(format, callback) {
+            // One round trip per page: click "next" as soon as this page's pixels
+            // are taken, so the browser renders the following page while this one
+            // is encoded and saved.
+            var self = this;
+            var next;
+            self.capturePage(format, function(result) {
+                if (next === undefined) next = self.nextPage();
+                callback({ page: result, next: next });
+            }, function() {
+                next = self.nextPage();
+            });
+        },
+        nextPage: function() {
+            if (!this._nextBtn || !document.contains(this._nextBtn)) {
+                this._nextBtn = document.querySelector('[data-testid="bp-PageControls-next"]');
+            }
+            var nextBtn = this._nextBtn;
+            // null: no button (toolbar not mounted yet); false: disabled (last page)
+            if (!nextBtn) return null;
+            if (nextBtn.disabled) return false;
+            nextBtn.click();
+            return true;
+        },
+        currentPage: function() {
+            // The page the viewer is on: from the page controls ("3 / 12", or their
+            // input while editing), else the numbered page container nearest the
+            // viewport centre; null if neither can be read.
+            var controls = document.querySelector('.bp-PageControls, .bp-PageControlsForm, [class*="PageControls"]');
+            if (controls) {
+                var input = controls.querySelector('input');
+                var value = input ? parseInt(input.value, 10) : NaN;
+                if (value > 0) return value;
+                var match = (controls.textContent || '').match(/(\\d+)\\s*\\/\\s*\\d+/);
+                if (match) return parseInt(match[1], 10);
+            }
+            var pages = this.previewRoot().querySelectorAll('.page[data-page-number]');
+            var centre = window.innerHeight / 2;
+            var best = null, bestDistance = Infinity;
+            for (var i = 0; i < pages.length; i++) {
+                var rect = pages[i].getBoundingClientRect();
+                if (rect.height === 0) continue;
+                var distance = rect.top <= centre && rect.bottom >= centre ? 0 :
+                    Math.min(Math.abs(rect.top - centre), Math.abs(rect.bottom - centre));
+                if (distance < bestDistance) {
+                    bestDistance = distance;
+                    best = parseInt(pages[i].getAttribute('data-page-number'), 10);
+                }
+            }
+            return best;
+        },
+        waitForCurrentPage: function(n, timeoutMs, callback) {
+            // Calls back with n once the viewer is on page n, or with the page it
+            // is on (possibly null) after timeoutMs.
+            var self = this;
+            var deadline = Date.now() + timeoutMs;
+            (function check() {
+                var page = self.currentPage();
+                if (page === n || Date.now() > deadline) return callback(page);
+                setTimeout(check, 50);
+            })();
+        },
+        pageReady: function(n) {
+            // null when the viewer has no numbered page containers to inspect
+            var page = this.previewRoot().querySelector('.page[data-page-number="' + n + '"]');
+            if (!page) return null;
+            if (page.querySelector('.loadingIcon:not(.notVisible)')) return false;
+            var canvas = page.querySelector('canvas');
+            if (canvas && canvas.width > 0 && !canvas.hidden) return true;
+            var img = page.querySelector('img');
+            return !!(img && img.complete && img.naturalWidth > 0);
+        },
+        waitForPage: function(n, timeoutMs, callback) {
+            // Re-check pageReady whenever the page's subtree changes or an image
+            // in it loads, instead of polling from Python.
+            var self = this;
+            var ready = self.pageReady(n);
+            if (ready !== false) {
+                callback(ready);
+                return;
+            }
+            var page = self.previewRoot().querySelector('.page[data-page-number="' + n + '"]');
+            var done = false;
+            var observer = new MutationObserver(check);
+            var timer = setTimeout(function() { finish(false); }, timeoutMs);
+            function finish(result) {
+                if (done) return;
+                done = true;
+                observer.disconnect();
+                page.removeEventListener('load', check, true);
+                clearTimeout(timer);
+                callback(result);
+            }
+            function check() {
+                if (self.pageReady(n)) finish(true);
+            }
+            observer.observe(page, { childList: true, subtree: true, attributes: true });
+            page.addEventListener('load', check, true);
+        }
+    };
+"""
+
+
+# Third-party analytics and tracking the Box page pulls in; none of it is needed
+# to render the preview, so the browser is told not to fetch it.
+_BLOCKED_URLS = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*segment.com*",
+    "*segment.io*",
+    "*nr-data.net*",
+    "*newrelic.com*",
+    "*optimizely.com*",
+    "*qualtrics.com*",
+    "*intercom.io*",
+]
 
 
 class Scraper:
-    def __init__(self, url, driver_location=None, wait_time=None):
+    def __init__(self, url, driver_location=None, wait_time=None, dpi_scale=1.5, debugger_address=None):
+        # Selenium and webdriver-manager are imported here so --help,
+        # argument errors and --from-images runs don't pay for them.
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+
         chrome_options = Options()
-        chrome_options.add_argument("--headless=new")
-        chrome_options.add_argument("--window-size=2560,4000")
-        chrome_options.add_argument("--force-device-scale-factor=2")
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option('useAutomationExtension', False)
+        if debugger_address:
+            # Attach to a Chrome that is already running; launch flags don't apply
+            chrome_options.add_experimental_option("debuggerAddress", debugger_address)
+        else:
+            chrome_options.add_argument("--headless=new")
+            chrome_options.add_argument("--window-size=2560,4000")
+            chrome_options.add_argument(f"--force-device-scale-factor={dpi_scale:g}")
+            chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+            chrome_options.add_experimental_option('useAutomationExtension', False)
         chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
 
         self.wait_load_time = wait_time
@@ -67,29 +440,61 @@ class Scraper:
         if driver_location:
             service = Service(executable_path=driver_location)
         else:
+            from webdriver_manager.chrome import ChromeDriverManager
             service = Service(ChromeDriverManager().install())
         self.driver_obj = webdriver.Chrome(service=service, options=chrome_options)
+        # Keep our own chromedriver process so cleanup never touches other runs' drivers
+        self._driver_process = self.driver_obj.service.process
+        self._attached = bool(debugger_address)
+        if self._attached:
+            # Work in a tab of our own so cleanup can close it and leave the browser running
+            self.driver_obj.switch_to.new_window('tab')
+        with contextlib.suppress(Exception):
+            self.driver_obj.execute_cdp_cmd('Network.enable', {})
+            self.driver_obj.execute_cdp_cmd('Network.setBlockedURLs', {'urls': _BLOCKED_URLS})
+        # Install the capture helpers into every document this tab loads; if the
+        # browser refuses, capture_preview_images_cdp injects them itself.
+        self._helpers_preinstalled = False
+        with contextlib.suppress(Exception):
+            self.driver_obj.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument',
+                                            {'source': _CAPTURE_HELPERS_JS})
+            self._helpers_preinstalled = True
 
         atexit.register(self._cleanup)
         self._original_sigint = signal.signal(signal.SIGINT, self._signal_handler)
         self._original_sigterm = signal.signal(signal.SIGTERM, self._signal_handler)
 
     def _cleanup(self):
+        # Safe to call more than once: atexit, a signal and clean() may all get here
+        driver, self.driver_obj = self.driver_obj, None
+        if driver is not None:
+            if self._attached:
+                with contextlib.suppress(Exception):
+                    driver.close()
+            # chromedriver only shuts down browsers it launched itself
+            with contextlib.suppress(Exception):
+                driver.quit()
         try:
-            if hasattr(self, 'driver_obj') and self.driver_obj:
-                self.driver_obj.quit()
-                self.driver_obj = None
-        except Exception:
-            pass
-        try:
-            subprocess.run(['pkill', '-f', 'chromedriver'], capture_output=True, timeout=5)
+            process = self._driver_process
+            if process is not None and process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=3)
+                except subprocess.TimeoutExpired:
+                    process.kill()
         except Exception:
             pass
 
+    def _restore_signals(self):
+        signal.signal(signal.SIGINT, self._original_sigint)
+        signal.signal(signal.SIGTERM, self._original_sigterm)
+
     def _signal_handler(self, signum, frame):
         print(f"\nReceived signal {signum}, cleaning up...")
+        # Restore first so a second Ctrl-C during cleanup behaves normally
+        self._restore_signals()
         self._cleanup()
-        sys.exit(0)
+        sys.exit(128 + signum)
 
     def __enter__(self):
         return self
@@ -99,48 +504,37 @@ class Scraper:
         return False
 
     def load_url(self):
+        from selenium.common.exceptions import TimeoutException
+
         driver = self.driver_obj
         driver.get(self.url)
 
         max_wait = self.wait_load_time
-        poll_interval = 0.5
-        waited = 0
-
         print(f"Waiting for preview to load (max {max_wait}s)...")
 
-        while waited < max_wait:
-            ready = driver.execute_script("""
-                var imgs = document.querySelectorAll('img[src^="data:"]');
-                for (var i = 0; i < imgs.length; i++) {
-                    if (imgs[i].src.length > 1000) return true;
-                }
-                var canvases = document.querySelectorAll('canvas');
-                for (var i = 0; i < canvases.length; i++) {
-                    var rect = canvases[i].getBoundingClientRect();
-                    if (rect.width > 100 && rect.height > 100) return true;
-                }
-                var containers = document.querySelectorAll('[class*="bp-doc"], [class*="PreviewContent"]');
-                for (var i = 0; i < containers.length; i++) {
-                    if (containers[i].scrollHeight > 1000) return true;
-                }
-                return false;
-            """)
-
-            if ready:
-                print(f"Preview loaded in {waited:.1f}s")
-                time.sleep(0.5)
-                return
-
-            time.sleep(poll_interval)
-            waited += poll_interval
-
-        print(f"Timeout after {max_wait}s, proceeding anyway...")
+        # The readiness wait is a single async script, so it needs to be allowed to run that long
+        driver.set_script_timeout(max(30, max_wait + 5))
+        start = time.monotonic()
+        try:
+            loaded = driver.execute_async_script(_PREVIEW_READY_JS, int(max_wait * 1000))
+        except TimeoutException:
+            loaded = False
+        if loaded:
+            print(f"Preview loaded in {time.monotonic() - start:.1f}s")
+        else:
+            print(f"Timeout after {max_wait}s, proceeding anyway...")
 
     def get_download_title(self):
-        title = str(self.driver_obj.title).split("|")[0][:-1]
-        return str(title.split(".")[:-1][0])
+        # An untitled page would otherwise write into out/ itself and produce ".pdf"
+        return _TITLE_RE.match(self.driver_obj.title).group(1) or "download"
+
+    def capture_preview_images_cdp(self, output_dir, scroll_pause=0.5, max_pages=None, image_format='png',
+                                   resume=False):
+        from selenium.webdriver.common.action_chains import ActionChains
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from tqdm import tqdm
 
-    def capture_preview_images_cdp(self, output_dir, scroll_pause=0.5, max_pages=None):
         driver = self.driver_obj
         os.makedirs(output_dir, exist_ok=True)
 
@@ -150,11 +544,10 @@ class Scraper:
         try:
             preview = driver.find_element('css selector', '.bp-doc, [class*="bp-doc"], .bp-content')
             ActionChains(driver).move_to_element(preview).perform()
-            for _ in range(20):
-                if driver.execute_script("return document.querySelector('.bp-PageControls') !== null;"):
-                    break
-                time.sleep(0.1)
+            WebDriverWait(driver, 2, poll_frequency=0.05).until(
+                lambda d: d.find_elements(By.CSS_SELECTOR, '.bp-PageControls'))
         except Exception:
+            # Includes TimeoutException: without the toolbar we fall back to text matching
             pass
 
         # Get page count
@@ -178,144 +571,277 @@ class Scraper:
         if total_pages:
             print(f"Detected {total_pages} pages")
 
-        pbar_total = max_pages if max_pages else (total_pages or 100)
-        pbar = tqdm(total=pbar_total, unit="pages", desc="Capturing", dynamic_ncols=True)
-
-        page_count = 0
-        target_pages = max_pages or total_pages or 500
-        time.sleep(0.5)
+        if not self._helpers_preinstalled:
+            driver.execute_script(_CAPTURE_HELPERS_JS)
+
+        # When resuming, keep the pages already on disk and step the viewer past them
+        filenames = _list_pages(output_dir) if resume else []
+        page_count = len(filenames)
+        exhausted = False
+        resuming = bool(filenames) and not (max_pages and page_count >= max_pages)
+        if resuming:
+            print(f"Resuming after {page_count} existing pages")
+            stepped = 0
+            deadline = time.monotonic() + (self.wait_load_time or 15)
+            while stepped < page_count:
+                clicked = driver.execute_script("return window.__boxCapture.nextPage();")
+                if clicked:
+                    stepped += 1
+                elif clicked is None and time.monotonic() < deadline:
+                    # The page controls may not have mounted yet
+                    time.sleep(0.1)
+                else:
+                    break
+            if stepped < page_count:
+                if clicked is False and not (total_pages and page_count < total_pages):
+                    # Ran out of pages: everything was already captured
+                    exhausted = True
+                else:
+                    raise click.ClickException(
+                        f"Could not step the viewer past page {stepped + 1} to resume "
+                        f"({page_count} pages saved); run without --resume to start over")
+            else:
+                # The clicks can run ahead of the viewer; capturing before it is on the
+                # first new page would save the last old page again and shift the rest.
+                shown = driver.execute_async_script(
+                    "window.__boxCapture.waitForCurrentPage(arguments[0], arguments[1], "
+                    "arguments[arguments.length - 1]);",
+                    page_count + 1, int((self.wait_load_time or 15) * 1000))
+                if shown is not None and shown != page_count + 1:
+                    raise click.ClickException(
+                        f"The viewer is on page {shown} instead of {page_count + 1} after stepping "
+                        "past the saved pages; run without --resume to start over")
 
-        for target_page in range(1, target_pages + 1):
-            if max_pages and page_count >= max_pages:
-                break
+        pbar_total = max_pages if max_pages else (total_pages or 100)
+        # disable=None turns the bar off when stderr is not a TTY (CI logs, pipes)
+        pbar = tqdm(total=pbar_total, initial=page_count, unit="pages", desc="Capturing",
+                    dynamic_ncols=True, disable=None)
+
+        # A single background writer keeps base64 decoding and disk I/O off the
+        # capture loop; the bounded queue stops it from buffering more than a few pages.
+        writes = queue.Queue(maxsize=8)
+        results = []
+        writer = threading.Thread(target=_drain_writes, args=(writes, results), daemon=True)
+        writer.start()
+        target_pages = page_count if exhausted else max_pages or total_pages or 500
+        page_prefix = os.path.join(output_dir, "page_")
 
-            if target_page % 20 == 1:
-                try:
-                    preview = driver.find_element('css selector', '.bp-doc, .bp-content')
-                    ActionChains(driver).move_to_element(preview).perform()
-                except Exception:
-                    pass
-
-            img_data = driver.execute_async_script("""
-                var callback = arguments[arguments.length - 1];
-                var startTime = Date.now();
-                var maxWait = 2000;
-                var minWidth = 800;
-
-                function tryCapture() {
-                    var viewportCenter = window.innerHeight / 2;
-                    var bestElement = null;
-                    var bestDistance = Infinity;
-                    var bestType = null;
-
-                    var canvases = document.querySelectorAll('canvas');
-                    for (var i = 0; i < canvases.length; i++) {
-                        var c = canvases[i];
-                        var rect = c.getBoundingClientRect();
-                        if (c.width >= minWidth && rect.height > 100) {
-                            var center = rect.top + rect.height / 2;
-                            var distance = Math.abs(center - viewportCenter);
-                            if (distance < bestDistance) {
-                                bestDistance = distance;
-                                bestElement = c;
-                                bestType = 'canvas';
-                            }
-                        }
-                    }
+        try:
+            if resuming and not exhausted:
+                self._wait_for_page(page_count + 1, scroll_pause)
 
-                    var imgs = document.querySelectorAll('img');
-                    for (var i = 0; i < imgs.length; i++) {
-                        var img = imgs[i];
-                        var rect = img.getBoundingClientRect();
-                        if (img.naturalWidth >= minWidth && rect.height > 100 &&
-                            (img.src.startsWith('blob:') || img.src.startsWith('data:'))) {
-                            var center = rect.top + rect.height / 2;
-                            var distance = Math.abs(center - viewportCenter);
-                            if (distance < bestDistance) {
-                                bestDistance = distance;
-                                bestElement = img;
-                                bestType = 'img';
-                            }
-                        }
-                    }
+            for target_page in range(page_count + 1, target_pages + 1):
+                if max_pages and page_count >= max_pages:
+                    break
 
-                    if (!bestElement) {
-                        if (Date.now() - startTime < maxWait) {
-                            setTimeout(tryCapture, 100);
-                        } else {
-                            callback(null);
-                        }
-                        return;
-                    }
+                if target_page % 20 == 1:
+                    try:
+                        preview = driver.find_element('css selector', '.bp-doc, .bp-content')
+                        ActionChains(driver).move_to_element(preview).perform()
+                    except Exception:
+                        pass
 
-                    try {
-                        var dataUrl, width, height;
-                        if (bestType === 'canvas') {
-                            dataUrl = bestElement.toDataURL('image/png');
-                            width = bestElement.width;
-                            height = bestElement.height;
-                        } else {
-                            var canvas = document.createElement('canvas');
-                            canvas.width = bestElement.naturalWidth;
-                            canvas.height = bestElement.naturalHeight;
-                            var ctx = canvas.getContext('2d');
-                            ctx.drawImage(bestElement, 0, 0);
-                            dataUrl = canvas.toDataURL('image/png');
-                            width = canvas.width;
-                            height = canvas.height;
-                        }
-                        if (dataUrl && dataUrl.length > 1000) {
-                            callback({ dataUrl: dataUrl, width: width, height: height });
-                        } else {
-                            callback(null);
-                        }
-                    } catch(e) {
-                        callback(null);
-                    }
-                }
-                tryCapture();
-            """)
+                step = driver.execute_async_script(
+                    "window.__boxCapture.captureAndAdvance(arguments[0], arguments[arguments.length - 1]);",
+                    image_format)
+                img_data, next_clicked = step['page'], step['next']
 
-            if img_data:
-                page_count += 1
-                try:
+                if img_data:
+                    page_count += 1
                     data_url = img_data['dataUrl']
-                    header, data = data_url.split(',', 1)
-                    ext = 'png' if 'png' in header else 'jpg'
-                    filename = os.path.join(output_dir, f"page_{page_count:04d}.{ext}")
-                    with open(filename, 'wb') as f:
-                        f.write(base64.b64decode(data))
+                    ext = 'png' if data_url.startswith('data:image/png') else 'jpg'
+                    filename = f"{page_prefix}{page_count:04d}.{ext}"
+                    # Decoding happens on the writer thread, off the capture loop
+                    writes.put((page_count, filename, data_url))
                     pbar.update(1)
-                except Exception as e:
-                    pbar.write(f"Error saving page {page_count}: {e}")
-                    page_count -= 1
-            else:
-                pbar.write(f"Warning: Could not capture page {target_page}")
+                else:
+                    pbar.write(f"Warning: Could not capture page {target_page}")
 
-            next_clicked = driver.execute_script("""
-                var nextBtn = document.querySelector('[data-testid="bp-PageControls-next"]');
-                if (nextBtn && !nextBtn.disabled) {
-                    nextBtn.click();
-                    return true;
-                }
-                return false;
-            """)
+                if not next_clicked:
+                    break
 
-            if not next_clicked:
-                break
+                self._wait_for_page(target_page + 1, scroll_pause)
+        finally:
+            writes.put(None)
+            writer.join()
 
-            time.sleep(scroll_pause * 0.2)
+        for page_num, filename, error in results:
+            if error is None:
+                filenames.append(filename)
+            else:
+                pbar.write(f"Error saving page {page_num}: {error}")
+        page_count = len(filenames)
 
         pbar.close()
         print(f"Captured {page_count} pages")
-        return page_count
+        return page_count, filenames
+
+    def _wait_for_page(self, page_number, timeout):
+        """Wait up to timeout seconds for the viewer to render page_number.
+
+        Falls back to a short fixed pause when the page's render state can't be read.
+        """
+        from selenium.common.exceptions import TimeoutException
+
+        try:
+            ready = self.driver_obj.execute_async_script(
+                "window.__boxCapture.waitForPage(arguments[0], arguments[1], arguments[arguments.length - 1]);",
+                page_number, int(timeout * 1000))
+        except TimeoutException:
+            # Longer than the driver's script timeout; the page has had its chance
+            return
+        if ready is None:
+            time.sleep(timeout * 0.2)
 
     def clean(self):
         self._cleanup()
-        if hasattr(self, '_original_sigint'):
-            signal.signal(signal.SIGINT, self._original_sigint)
-        if hasattr(self, '_original_sigterm'):
-            signal.signal(signal.SIGTERM, self._original_sigterm)
+        atexit.unregister(self._cleanup)
+        self._restore_signals()
+
+
+_SEPARATOR = "=+" * 20
+
+
+def _download(url, out, driver_path, wait_time, dpi_scale, chrome_address, max_pages, scroll_pause,
+              image_format, resume, on_captured=None, skip_existing=False, ocr=False, claimed_names=None):
+    """Capture the preview at url into out/<title>/.
+
+    on_captured(dl_name, output_dir, image_files) is called once the pages are on
+    disk but before the browser is shut down. With skip_existing, nothing is captured
+    if the PDF this run would produce (out/<title>.pdf, or out/<title>_ocr.pdf with
+    ocr) already exists. claimed_names maps titles to the URL using them across a
+    batch; a title already claimed by another URL gets the share id appended.
+    Returns (dl_name, output_dir, image_files).
+    """
+    box_object = None
+    try:
+        box_object = Scraper(url, driver_path, wait_time, dpi_scale=dpi_scale, debugger_address=chrome_address)
+        box_object.load_url()
+        dl_name = box_object.get_download_title()
+        if claimed_names is not None and claimed_names.setdefault(dl_name, url) != url:
+            dl_name = f"{dl_name} ({urlsplit(url).path.rstrip('/').rsplit('/', 1)[-1]})"
+
+        click.echo(_SEPARATOR)
+        click.echo(f"Title: {click.style(dl_name, fg='green')}")
+        click.echo(f"URL: {url}")
+
+        output_dir = os.path.join(out, dl_name)
+        pdf_path = _pdf_path(out, dl_name, ocr)
+        if skip_existing and os.path.exists(pdf_path):
+            click.secho(f"✓ {os.path.basename(pdf_path)} already exists, skipping (use --force to download again)",
+                        fg='green')
+            return dl_name, output_dir, []
+        os.makedirs(output_dir, exist_ok=True)
+
+        click.echo(_SEPARATOR)
+        num_images, image_files = box_object.capture_preview_images_cdp(
+            output_dir, scroll_pause=scroll_pause, max_pages=max_pages, image_format=image_format,
+            resume=resume)
+
+        click.echo(_SEPARATOR)
+        click.secho(f"✓ Captured {num_images} images to: {output_dir}", fg='green')
+        if on_captured:
+            on_captured(dl_name, output_dir, image_files)
+    finally:
+        if box_object:
+            box_object.clean()
+    return dl_name, output_dir, image_files
+
+
+def _pdf_path(out, dl_name, ocr=False):
+    """Return the path of the PDF built for dl_name, or of its OCR'd copy."""
+    return os.path.join(out, f"{dl_name}_ocr.pdf" if ocr else f"{dl_name}.pdf")
+
+
+def _create_pdf(dl_name, output_dir, image_files, out, grayscale, ocr, ocr_lang, keep_images, workers=None):
+    """Assemble image_files into out/<dl_name>.pdf, then optionally OCR it and remove the images.
+
+    workers caps the processes used for grayscale conversion and OCR (default: one per CPU).
+    """
+    import img2pdf
+
+    os.makedirs(out, exist_ok=True)
+    pdf_path = _pdf_path(out, dl_name)
+    click.echo(f"Creating PDF: {pdf_path}")
+
+    if grayscale:
+        click.echo("Converting to grayscale...")
+        # Spawn rather than fork: this can run on a worker thread while the main
+        # thread shuts the browser down, and forking a threaded process can deadlock.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            image_data = list(executor.map(_to_grayscale_png, image_files, chunksize=8))
+        with open(pdf_path, "wb") as f:
+            img2pdf.convert(image_data, outputstream=f)
+    else:
+        with open(pdf_path, "wb") as f:
+            img2pdf.convert(image_files, outputstream=f)
+
+    click.secho(f"✓ Created PDF: {pdf_path}", fg='green')
+
+    if ocr:
+        ocr_pdf_path = _pdf_path(out, dl_name, ocr=True)
+        click.echo("Running OCR (this may take a while)...")
+
+        try:
+            subprocess.run(["ocrmypdf", "--version"], capture_output=True, check=True)
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            raise click.ClickException("ocrmypdf is not installed. Install with: brew install ocrmypdf")
+
+        cmd = [
+            "ocrmypdf",
+            "--language", ocr_lang,
+            "--optimize", "0",
+            "--skip-text",
+            "--jobs", str(workers or os.cpu_count() or 4),
+            # Plain PDF skips the Ghostscript PDF/A conversion pass
+            "--output-type", "pdf",
+            pdf_path,
+            ocr_pdf_path
+        ]
+
+        result = subprocess.run(cmd)
+        if result.returncode == 0:
+            click.secho(f"✓ Created OCR PDF: {ocr_pdf_path}", fg='green')
+        else:
+            click.secho(f"OCR failed with exit code {result.returncode}", fg='red')
+
+    if not keep_images:
+        for img_file in image_files:
+            os.remove(img_file)
+        # Only drop the folder if nothing but our pages was in it
+        with contextlib.suppress(OSError):
+            os.rmdir(output_dir)
+        click.echo("Cleaned up individual images")
+
+
+def _process_url(url, out, driver_path, wait_time, dpi_scale, chrome_address, max_pages, scroll_pause,
+                 image_format, resume, force, pdf, keep_images, grayscale, ocr, ocr_lang, pdf_workers=None,
+                 claimed_names=None):
+    """Download one URL and build its PDF; module-level so it can run in a worker process."""
+    pdf_jobs = []
+
+    def start_pdf(dl_name, output_dir, image_files):
+        # Build the PDF while the browser shuts down; quitting Chrome is mostly waiting
+        if pdf and image_files:
+            pdf_jobs.append(executor.submit(
+                _create_pdf, dl_name, output_dir, image_files, out, grayscale, ocr, ocr_lang, keep_images,
+                pdf_workers))
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        dl_name, _, _ = _download(url, out, driver_path, wait_time, dpi_scale, chrome_address, max_pages,
+                                  scroll_pause, image_format, resume, on_captured=start_pdf,
+                                  skip_existing=pdf and not force, ocr=ocr, claimed_names=claimed_names)
+        for job in pdf_jobs:
+            job.result()
+    return dl_name
+
+
+def _read_urls(path):
+    """Return the non-empty, non-comment lines of a URL list file, without duplicates."""
+    with open(path) as f:
+        urls = [line.strip() for line in f]
+    # A repeated URL would have two workers writing the same folder and PDF at once
+    return list(dict.fromkeys(u for u in urls if u and not u.startswith('#')))
 
 
 @click.command()
@@ -324,134 +850,99 @@ class Scraper:
 @click.option('--wait-time', default=15, type=int, help='Wait time for selenium to load in seconds')
 @click.option('--out', '-o', default=None, help='Output file folder location')
 @click.option('--max-pages', default=None, type=int, help='Maximum pages to capture (for testing)')
-@click.option('--scroll-pause', default=1.5, type=float, help='Pause between scrolls in seconds')
+@click.option('--scroll-pause', default=1.5, type=float, help='Maximum time to wait for each page to render, in seconds')
 @click.option('--pdf/--no-pdf', default=True, help='Concatenate all pages into a single PDF')
 @click.option('--keep-images/--no-keep-images', default=True, help='Keep individual images after creating PDF')
+@click.option('--dpi-scale', default=1.5, type=click.FloatRange(0.5, 4),
+              help='Browser device scale factor; lower is faster with smaller pages (2 for the sharpest text). '
+                   'Ignored with --chrome-address')
+@click.option('--chrome-address', default=None, metavar='HOST:PORT',
+              help='Attach to a running Chrome started with --remote-debugging-port instead of launching one')
+@click.option('--image-format', default='png', type=click.Choice(['png', 'jpeg']),
+              help='Format to save captured pages in (jpeg is much smaller, slightly lossy)')
+@click.option('--resume', is_flag=True, help='Keep pages already captured in the output folder and continue after them')
+@click.option('--force', is_flag=True, help='Download again even if the PDF already exists')
 @click.option('--grayscale', '-g', is_flag=True, help='Convert images to grayscale before creating PDF')
 @click.option('--ocr', is_flag=True, help='Add OCR text layer to PDF (requires ocrmypdf)')
 @click.option('--ocr-lang', default='eng', help='OCR language (e.g., eng, fra, eng+fra)')
 @click.option('--from-images', '-i', default=None, type=click.Path(exists=True),
               help='Skip download, process existing images from this folder')
+@click.option('--urls-file', default=None, type=click.Path(exists=True, dir_okay=False),
+              help='Download every box.com URL listed in this file (one per line)')
+@click.option('--jobs', '-j', default=4, type=click.IntRange(min=1),
+              help='Number of browsers to run in parallel with --urls-file')
 @click.version_option(version='2.0', prog_name='Box.com PDF Downloader')
 def main(url, driver_path, wait_time, out, max_pages, scroll_pause, pdf, keep_images,
-         grayscale, ocr, ocr_lang, from_images):
+         dpi_scale, chrome_address, image_format, resume, force, grayscale, ocr, ocr_lang, from_images, urls_file, jobs):
     """Download PDF previews from Box.com shared links.
 
-    URL: The box.com shared URL to download from (optional if using --from-images)
+    URL: The box.com shared URL to download from (optional if using --from-images
+    or --urls-file)
     """
-    style = "=+" * 20
-
-    click.echo(style)
+    click.echo(_SEPARATOR)
     click.secho("Box.com PDF Downloader", fg='cyan', bold=True)
 
     if out is None:
-        out = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dl_files")
-
-    dl_name = None
-    output_dir = None
-    num_images = 0
+        out = _DEFAULT_OUT
 
     # Mode 1: Process existing images from folder
     if from_images:
         output_dir = from_images
         dl_name = os.path.basename(output_dir.rstrip('/'))
-        image_files = sorted(glob.glob(os.path.join(output_dir, "page_*.png")))
-        image_files += sorted(glob.glob(os.path.join(output_dir, "page_*.jpg")))
-        image_files = sorted(image_files)
-        num_images = len(image_files)
+        image_files = _list_pages(output_dir)
 
-        if num_images == 0:
+        if not image_files:
             raise click.ClickException(f"No images found in {output_dir}")
 
-        click.echo(f"Processing {num_images} existing images from: {output_dir}")
-
-    # Mode 2: Download from URL
-    else:
-        if not url:
-            raise click.UsageError("URL is required (or use --from-images to process existing images)")
-
-        if not url_checker(url):
-            raise click.BadParameter('URL must be a valid box.com URL (http:// or https://)')
-
-        box_object = None
-        try:
-            box_object = Scraper(url, driver_path, wait_time)
-            box_object.load_url()
-            dl_name = box_object.get_download_title()
-
-            click.echo(style)
-            click.echo(f"Title: {click.style(dl_name, fg='green')}")
-            click.echo(f"URL: {url}")
-
-            output_dir = os.path.join(out, dl_name)
-            os.makedirs(output_dir, exist_ok=True)
-
-            click.echo(style)
-            num_images = box_object.capture_preview_images_cdp(output_dir, scroll_pause=scroll_pause, max_pages=max_pages)
-
-            click.echo(style)
-            click.secho(f"✓ Captured {num_images} images to: {output_dir}", fg='green')
-        finally:
-            if box_object:
-                box_object.clean()
-
-    # Create PDF if requested
-    if pdf and num_images > 0 and dl_name and output_dir:
-        pdf_path = os.path.join(out, f"{dl_name}.pdf")
-        click.echo(f"Creating PDF: {pdf_path}")
-
-        image_files = sorted(glob.glob(os.path.join(output_dir, "page_*.png")))
-        image_files += sorted(glob.glob(os.path.join(output_dir, "page_*.jpg")))
-        image_files = sorted(image_files)
-
-        if image_files:
-            if grayscale:
-                click.echo("Converting to grayscale...")
-                image_data = []
-                for img_path in image_files:
-                    img = Image.open(img_path).convert('L')
-                    buf = io.BytesIO()
-                    img.save(buf, format='PNG')
-                    image_data.append(buf.getvalue())
-                with open(pdf_path, "wb") as f:
-                    f.write(img2pdf.convert(image_data))
-            else:
-                with open(pdf_path, "wb") as f:
-                    f.write(img2pdf.convert(image_files))
-
-            click.secho(f"✓ Created PDF: {pdf_path}", fg='green')
-
-            if ocr:
-                ocr_pdf_path = os.path.join(out, f"{dl_name}_ocr.pdf")
-                click.echo("Running OCR (this may take a while)...")
-
-                try:
-                    subprocess.run(["ocrmypdf", "--version"], capture_output=True, check=True)
-                except (subprocess.CalledProcessError, FileNotFoundError):
-                    click.secho("Error: ocrmypdf is not installed. Install with: brew install ocrmypdf", fg='red')
-                    sys.exit(1)
-
-                cmd = [
-                    "ocrmypdf",
-                    "--language", ocr_lang,
-                    "--optimize", "0",
-                    "--skip-text",
-                    "--jobs", "4",
-                    pdf_path,
-                    ocr_pdf_path
-                ]
-
-                result = subprocess.run(cmd)
-                if result.returncode == 0:
-                    click.secho(f"✓ Created OCR PDF: {ocr_pdf_path}", fg='green')
-                else:
-                    click.secho(f"OCR failed with exit code {result.returncode}", fg='red')
-
-            if not keep_images:
-                for img_file in image_files:
-                    os.remove(img_file)
-                os.rmdir(output_dir)
-                click.echo("Cleaned up individual images")
+        click.echo(f"Processing {len(image_files)} existing images from: {output_dir}")
+        if pdf:
+            _create_pdf(dl_name, output_dir, image_files, out, grayscale, ocr, ocr_lang, keep_images)
+        return
+
+    if url and urls_file:
+        raise click.UsageError("Pass either a URL or --urls-file, not both")
+
+    urls = _read_urls(urls_file) if urls_file else [url] if url else []
+    if not urls:
+        raise click.UsageError("URL is required (or use --urls-file, or --from-images to process existing images)")
+
+    bad_urls = [u for u in urls if not url_checker(u)]
+    if bad_urls:
+        raise click.BadParameter(f"URL must be a valid box.com URL (http:// or https://): {bad_urls[0]}")
+
+    process_url = functools.partial(
+        _process_url, out=out, driver_path=driver_path, wait_time=wait_time, dpi_scale=dpi_scale,
+        chrome_address=chrome_address, max_pages=max_pages, scroll_pause=scroll_pause,
+        image_format=image_format, resume=resume, force=force, pdf=pdf, keep_images=keep_images,
+        grayscale=grayscale, ocr=ocr, ocr_lang=ocr_lang)
+
+    # Mode 2: Download a single URL
+    if len(urls) == 1:
+        process_url(urls[0])
+        return
+
+    # Mode 3: Download a batch of URLs, one browser per worker process
+    failed = []
+    workers = min(jobs, len(urls))
+    # Share the CPUs between the workers' grayscale and OCR steps instead of each taking all of them
+    pdf_workers = max(1, (os.cpu_count() or 4) // workers)
+    # Titles aren't known until each page loads, so workers claim them as they go
+    # to keep two URLs with the same title from writing into the same folder
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+        claimed_names = manager.dict()
+        futures = {executor.submit(process_url, u, pdf_workers=pdf_workers, claimed_names=claimed_names): u
+                   for u in urls}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed.append(futures[future])
+                click.secho(f"Failed: {futures[future]}: {e}", fg='red')
+
+    click.echo(_SEPARATOR)
+    if failed:
+        raise click.ClickException(f"{len(failed)} of {len(urls)} URLs failed")
+    click.secho(f"✓ Downloaded {len(urls)} URLs", fg='green')
 
 
 if __name__ == "__main__":